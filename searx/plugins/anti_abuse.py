@@ -3,14 +3,21 @@
 to prevent automated scraping, API abuse, and excessive usage."""
 
 import logging
+import os
+import threading
 import time
 import typing as t
-from collections import defaultdict
+from urllib.parse import urlsplit
 
 import flask
 
 from searx.plugins import Plugin, PluginInfo
 
+try:
+    import redis
+except ImportError:
+    redis = None
+
 if t.TYPE_CHECKING:
     from searx.plugins import PluginCfg
     from searx.search import SearchWithPlugins
@@ -28,26 +35,137 @@ _AC_WINDOW = 60
 _GLOBAL_LIMIT = 120
 _GLOBAL_WINDOW = 60
 
-_search_buckets: dict[str, list[float]] = defaultdict(list)
-_ac_buckets: dict[str, list[float]] = defaultdict(list)
-_global_buckets: dict[str, list[float]] = defaultdict(list)
+# token buckets: ip -> (tokens, last_refill); capacity = limit, refill = limit/window
+_search_buckets: dict[str, tuple[float, float]] = {}
+_ac_buckets: dict[str, tuple[float, float]] = {}
+_global_buckets: dict[str, tuple[float, float]] = {}
+
+# Optional distributed backend: with REDIS_URL set (and redis installed) the
+# token bucket lives in Redis and is refilled/decremented atomically by a Lua
+# script, so limits hold across workers and hosts. Unset, buckets stay local.
+_TOKEN_BUCKET_LUA = """
+local k = KEYS[1]
+local cap = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local d = redis.call('HMGET', k, 't', 'l')
+local t = tonumber(d[1]) or cap
+local l = tonumber(d[2]) or now
+t = math.min(cap, t + (now - l) * rate)
+local allowed = 0
+if t >= 1 then t = t - 1; allowed = 1 end
+redis.call('HMSET', k, 't', t, 'l', now)
+redis.call('PEXPIRE', k, math.ceil((cap - t) / rate * 1000))
+return allowed
+"""
+
+_redis_script = None
+_REDIS_URL = os.environ.get("REDIS_URL", "")
+if _REDIS_URL and redis is not None:
+    try:
+        _redis_script = redis.Redis.from_url(_REDIS_URL).register_script(_TOKEN_BUCKET_LUA)
+        log.info("Anti-abuse rate limiter using Redis backend")
+    except Exception:
+        log.warning("Could not set up Redis rate-limit backend; using in-memory buckets")
+        _redis_script = None
+
+# 16 locks sharded by IP hash: threaded workers get atomic bucket updates
+# without funnelling every request through a single lock
+_LOCKS = tuple(threading.Lock() for _ in range(16))
+
+# Coarse clock for bucket refills: limit windows are ≥60s, so 10ms resolution
+# is plenty, and reading a list slot beats a clock_gettime call at the very
+# top of every request.
+_now_cached = [time.monotonic()]
+
+
+def _clock_tick():
+    while True:
+        _now_cached[0] = time.monotonic()
+        time.sleep(0.01)
+
+
+def _start_clock():
+    threading.Thread(target=_clock_tick, daemon=True, name="rate-limit-clock").start()
+
+
+_start_clock()
+# pre-fork servers (uwsgi without lazy-apps) import in the master and only the
+# forking thread survives into workers; without a restart the cached clock
+# would freeze and every bucket would stop refilling
+os.register_at_fork(after_in_child=_start_clock)
+
+# amortized eviction: every _SWEEP_EVERY checks, drop buckets idle long enough
+# to be fully refilled — keeps the maps bounded when scanners cycle source IPs
+_SWEEP_EVERY = 4096
+_sweep_counter = 0
+
+
+def _sweep(buckets: dict[str, tuple[float, float]], now: float, idle: float) -> None:
+    for ip, (_tokens, last) in list(buckets.items()):
+        if now - last > idle:
+            del buckets[ip]
+
+
+def _take_token(buckets: dict[str, tuple[float, float]], ip: str, capacity: int, refill_per_sec: float) -> bool:
+    """Take one token from ``ip``'s bucket; returns False when the bucket is empty
+    (i.e. the caller should be rate-limited)."""
+    global _sweep_counter
+    now = _now_cached[0]
+    _sweep_counter += 1
+    if _sweep_counter & (_SWEEP_EVERY - 1) == 0:
+        _sweep(buckets, now, capacity / refill_per_sec)
+    with _LOCKS[hash(ip) & 15]:
+        tokens, last = buckets.get(ip, (float(capacity), now))
+        tokens = min(capacity, tokens + (now - last) * refill_per_sec)
+        if tokens < 1.0:
+            buckets[ip] = (tokens, now)
+            return False
+        buckets[ip] = (tokens - 1.0, now)
+        return True
 
 
-def _check_limit(buckets: dict[str, list[float]], ip: str, limit: int, window: float) -> bool:
-    now = time.monotonic()
-    bucket = buckets[ip]
-    cutoff = now - window
-    buckets[ip] = bucket = [ts for ts in bucket if ts > cutoff]
-    if len(bucket) >= limit:
-        return True
-    bucket.append(now)
-    return False
+def _check_limit(
+    buckets: dict[str, tuple[float, float]], name: str, ip: str, limit: int, window: float
+) -> bool:
+    if _redis_script is not None:
+        try:
+            # wall clock, not monotonic: the timestamp must agree across hosts
+            allowed = _redis_script(
+                keys=["rl:%s:%s" % (name, ip)],
+                args=[limit, limit / window, time.time()],
+            )
+            return allowed == 0
+        except Exception:
+            log.debug("Redis rate-limit check failed; using in-memory bucket")
+    return not _take_token(buckets, ip, limit, limit / window)
+
+
+# referers whose parsed host may use the JSON/CSV/RSS output formats
+_ALLOWED_HOSTS = frozenset((
+    "localhost", "127.0.0.1",
+    "search.yeth.dev",
+    "search.yeth.uk", "search.software-resources.org",
+    "flightsearch.kids",
+))
+
+# per-endpoint limits: path -> (buckets, name, limit, window, 429 body, content type)
+_PER_PATH: dict[str, tuple[dict[str, tuple[float, float]], str, int, int, str, str]] = {
+    "/search": (
+        _search_buckets, "search", _SEARCH_LIMIT, _SEARCH_WINDOW,
+        "Too many searches. Please wait a moment.", "text/plain",
+    ),
+    "/autocompleter": (
+        _ac_buckets, "ac", _AC_LIMIT, _AC_WINDOW,
+        "[]", "application/json",
+    ),
+}
 
 
 def _get_ip() -> str:
     return (
         flask.request.headers.get("CF-Connecting-IP")
-        or flask.request.headers.get("X-Forwarded-For", "").split(",")[0].strip()
+        or flask.request.headers.get("X-Forwarded-For", "").partition(",")[0].strip()
         or flask.request.remote_addr
         or "unknown"
     )
@@ -71,11 +189,17 @@ class SXNGPlugin(Plugin):
     def init(self, app: flask.Flask) -> bool:
         @app.before_request
         def _rate_limit_check():
-            ip = _get_ip()
             path = flask.request.path
 
+            # static assets are not worth rate-limiting; skip all bucket and
+            # header work for the majority of requests
+            if path.startswith("/static/") or path == "/favicon.ico":
+                return None
+
+            ip = _get_ip()
+
             # Global rate limit
-            if _check_limit(_global_buckets, ip, _GLOBAL_LIMIT, _GLOBAL_WINDOW):
+            if _check_limit(_global_buckets, "global", ip, _GLOBAL_LIMIT, _GLOBAL_WINDOW):
                 log.warning("Global rate limit hit for %s on %s", ip, path)
                 return flask.Response(
                     "Rate limit exceeded. Please slow down.",
@@ -83,45 +207,38 @@ class SXNGPlugin(Plugin):
                     content_type="text/plain",
                 )
 
-            # Search endpoint rate limit
+            # Per-endpoint rate limit
+            cfg = _PER_PATH.get(path)
+            if cfg:
+                buckets, name, limit, window, body, ctype = cfg
+                if _check_limit(buckets, name, ip, limit, window):
+                    log.warning("Rate limit hit for %s on %s", ip, path)
+                    return flask.Response(body, status=429, content_type=ctype)
+
             if path == "/search":
-                if _check_limit(_search_buckets, ip, _SEARCH_LIMIT, _SEARCH_WINDOW):
-                    log.warning("Search rate limit hit for %s", ip)
-                    return flask.Response(
-                        "Too many searches. Please wait a moment.",
-                        status=429,
-                        content_type="text/plain",
-                    )
-
-            # Autocomplete endpoint rate limit
-            elif path == "/autocompleter":
-                if _check_limit(_ac_buckets, ip, _AC_LIMIT, _AC_WINDOW):
-                    return flask.Response(
-                        "[]",
-                        status=429,
-                        content_type="application/json",
-                    )
-
-            # Block JSON/RSS API output formats entirely for non-html consumers
-            # (prevents automated scraping via ?format=json)
-            fmt = flask.request.args.get("format", "")
-            if fmt in ("json", "csv", "rss") and path == "/search":
-                # Only allow if request appears to come from the instance itself
-                referer = flask.request.headers.get("Referer", "")
-                if not referer or not any(
-                    h in referer for h in (
-                        "localhost", "127.0.0.1",
-                        "search.yeth.dev",
-                        "search.yeth.uk", "search.software-resources.org",
-                        "flightsearch.kids",
-                    )
-                ):
-                    log.info("Blocked external API access from %s (format=%s)", ip, fmt)
-                    return flask.Response(
-                        "API access is not available on this instance.",
-                        status=403,
-                        content_type="text/plain",
-                    )
+                # Block JSON/RSS API output formats entirely for non-html
+                # consumers (prevents automated scraping via ?format=json);
+                # only parse the query string when the path can carry it
+                fmt = flask.request.args.get("format", "")
+                if fmt in ("json", "csv", "rss"):
+                    # Only allow if request appears to come from the instance
+                    # itself; parse the host out of the Referer rather than
+                    # substring-scanning it (a path containing "localhost"
+                    # must not pass)
+                    referer = flask.request.headers.get("Referer", "")
+                    try:
+                        host = urlsplit(referer).hostname if referer else None
+                    except ValueError:
+                        # attacker-controlled header; an unparsable Referer is
+                        # as disallowed as a missing one, never a 500
+                        host = None
+                    if host not in _ALLOWED_HOSTS:
+                        log.info("Blocked external API access from %s (format=%s)", ip, fmt)
+                        return flask.Response(
+                            "API access is not available on this instance.",
+                            status=403,
+                            content_type="text/plain",
+                        )
 
         log.info("Anti-abuse rate limiter registered")
         return True
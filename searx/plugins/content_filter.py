@@ -2,17 +2,25 @@
 """Content filter - risk-scored, context-aware blocking with dynamic
 domain blocklists and per-category guidance for a kid-safe search engine."""
 
+import asyncio
+import bisect
+import functools
 import logging
 import re
+import sys
 import threading
 import typing as t
-import urllib.request
-from concurrent.futures import ThreadPoolExecutor
 
 import flask
+import httpx
 from searx.plugins import Plugin, PluginInfo
 from searx.result_types.answer import Answer
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 if t.TYPE_CHECKING:
     from searx.plugins import PluginCfg
     from searx.search import SearchWithPlugins
@@ -430,17 +438,23 @@ _CATEGORIES: dict[str, dict] = {
     },
 }
 
-_EDUCATIONAL_PREFIXES: list[re.Pattern] = [
-    re.compile(r"^(?:history|origins?|evolution|timeline)\s+(?:of|behind)\b", re.I),
-    re.compile(r"^what\s+(?:is|are|was|were)\b", re.I),
-    re.compile(r"^(?:effects?|impact|consequences?|dangers?)\s+of\b", re.I),
-    re.compile(r"^(?:science|chemistry|physics|biology)\s+(?:of|behind)\b", re.I),
-    re.compile(r"^how\s+does?\s+\w+\s+work\b", re.I),
-    re.compile(r"^why\s+(?:is|are|do|does|did|was|were)\b", re.I),
-    re.compile(r"\b(?:for\s+kids|for\s+students|for\s+school|homework|essay|report|project)\b", re.I),
-    re.compile(r"\b(?:definition|meaning|explained|overview|summary)\b", re.I),
+# kept as separate source strings for readability, but compiled into one
+# union so detecting educational context is a single search
+_EDUCATIONAL_PREFIX_SOURCES: list[str] = [
+    r"^(?:history|origins?|evolution|timeline)\s+(?:of|behind)\b",
+    r"^what\s+(?:is|are|was|were)\b",
+    r"^(?:effects?|impact|consequences?|dangers?)\s+of\b",
+    r"^(?:science|chemistry|physics|biology)\s+(?:of|behind)\b",
+    r"^how\s+does?\s+\w+\s+work\b",
+    r"^why\s+(?:is|are|do|does|did|was|were)\b",
+    r"\b(?:for\s+kids|for\s+students|for\s+school|homework|essay|report|project)\b",
+    r"\b(?:definition|meaning|explained|overview|summary)\b",
 ]
 
+_EDUCATIONAL_RE: re.Pattern = re.compile(
+    "|".join("(?:%s)" % src for src in _EDUCATIONAL_PREFIX_SOURCES), re.I
+)
+
 _EDUCATIONAL_SCORE_REDUCTION = 30
 _NEVER_REDUCE = frozenset({
     "self_harm", "adult_content", "sexual_assault", "child_abuse",
@@ -449,31 +463,105 @@ _NEVER_REDUCE = frozenset({
 
 
 def _has_educational_context(query: str) -> bool:
-    for pat in _EDUCATIONAL_PREFIXES:
-        if pat.search(query):
-            return True
-    return False
-
-
-_BLOCK_RULES: list[tuple[re.Pattern, int, str, str, str, str]] = []
+    return _EDUCATIONAL_RE.search(query) is not None
+
+
+# (risk, term_masks, has_freeform, pattern) in descending risk order; each
+# pattern unions every category at that risk with a named group per category,
+# so scoring a query is one search per tier (stopping at the first hit, which
+# is by construction the highest risk) and m.lastgroup identifies the category.
+# term_masks holds one bigram bitset per literal term so a tier whose terms
+# share no bigram chain with the query is skipped without running its regex;
+# has_freeform marks tiers with handwritten patterns, which can't be
+# prefiltered and always run
+_RISK_TIERS: tuple[tuple[int, tuple[int, ...], bool, re.Pattern], ...] = ()
+
+# cumulative patterns for the per-result filter: _THRESHOLD_RES[i] matches
+# every rule whose risk is >= _THRESHOLD_RISKS[i] (risks sorted ascending)
+_THRESHOLD_RISKS: tuple[int, ...] = ()
+_THRESHOLD_RES: tuple[re.Pattern, ...] = ()
+
+# category -> (label, message, hotline), flattened once so a scoring hit is a
+# single dict lookup instead of indexing the nested _CATEGORIES entry thrice
+_CAT_INFO: dict[str, tuple[str, str, str]] = {}
+
+
+def _bigram_mask(text: str) -> int:
+    """256-bit bitset of the character bigrams in ``text``.
+
+    A literal term can only match inside a string whose mask is a superset of
+    the term's, so one int ``&``/``==`` pair rules out a doomed regex search."""
+    mask = 0
+    for a, b in zip(text, text[1:]):
+        mask |= 1 << ((ord(a) * 33 + ord(b)) & 255)
+    return mask
+
+
+def _category_sources(entry: dict) -> list[str]:
+    """Regex source fragments covering one category: a fused, boundary-wrapped
+    alternation of its terms (longest-first so longer terms win) plus any
+    handwritten patterns."""
+    alternation = "|".join(
+        sorted((re.escape(term) for term in entry["terms"]), key=len, reverse=True)
+    )
+    # single-char lookarounds instead of boundary alternations: no branch
+    # backtracking at the term edges, and the optional suffix is one group
+    sources = [
+        r"(?<![A-Za-z0-9])(?:" + alternation + r")(?:s|es|ed|ing)?(?![A-Za-z0-9])"
+    ]
+    sources.extend("(?:%s)" % raw_pat for raw_pat in entry.get("patterns", []))
+    return sources
 
 
 def _compile_rules():
+    by_risk: dict[int, list[str]] = {}
+    masks_by_risk: dict[int, list[int]] = {}
+    freeform_risks: set[int] = set()
     for cat, entry in _CATEGORIES.items():
         risk = entry["risk"]
-        label = entry["label"]
-        message = entry["message"]
-        hotline = entry.get("hotline", "")
-        for term in entry["terms"]:
-            escaped = re.escape(term)
-            pat = re.compile(
-                r"(?:^|[\s\-_/,;.!?\"'])" + escaped + r"(?:[\s\-_/,;.!?\"']|$|s|es|ing|ed)",
-                re.IGNORECASE,
-            )
-            _BLOCK_RULES.append((pat, risk, label, message, hotline, cat))
-        for raw_pat in entry.get("patterns", []):
-            pat = re.compile(raw_pat, re.IGNORECASE)
-            _BLOCK_RULES.append((pat, risk, label, message, hotline, cat))
+        sources = _category_sources(entry)
+        by_risk.setdefault(risk, []).append("(?P<%s>%s)" % (cat, "|".join(sources)))
+        masks_by_risk.setdefault(risk, []).extend(
+            _bigram_mask(term.lower()) for term in entry["terms"]
+        )
+        if entry.get("patterns"):
+            freeform_risks.add(risk)
+        # interned so the strings handed out per scoring hit are shared
+        # singletons rather than fresh references into the config dicts
+        _CAT_INFO[cat] = (
+            sys.intern(entry["label"]),
+            sys.intern(entry["message"]),
+            sys.intern(entry.get("hotline", "")),
+        )
+    global _RISK_TIERS, _THRESHOLD_RISKS, _THRESHOLD_RES
+    tiers: list[tuple[int, tuple[int, ...], bool, re.Pattern]] = []
+    cumulative: list[str] = []
+    thr_risks: list[int] = []
+    thr_res: list[re.Pattern] = []
+    for risk in sorted(by_risk, reverse=True):
+        tiers.append((
+            risk,
+            tuple(masks_by_risk[risk]),
+            risk in freeform_risks,
+            re.compile("|".join(by_risk[risk]), re.IGNORECASE),
+        ))
+        cumulative.extend(by_risk[risk])
+        thr_risks.append(risk)
+        thr_res.append(re.compile("|".join(cumulative), re.IGNORECASE))
+    # read-only after compile: tuples iterate marginally faster and make the
+    # immutability explicit
+    _RISK_TIERS = tuple(tiers)
+    _THRESHOLD_RISKS = tuple(reversed(thr_risks))
+    _THRESHOLD_RES = tuple(reversed(thr_res))
+
+
+def _rules_pattern(threshold: int) -> "re.Pattern | None":
+    """One pattern matching every rule with risk >= threshold, or None when
+    the threshold is above the highest rule risk."""
+    i = bisect.bisect_left(_THRESHOLD_RISKS, threshold)
+    if i == len(_THRESHOLD_RISKS):
+        return None
+    return _THRESHOLD_RES[i]
 
 
 _compile_rules()
@@ -494,82 +582,152 @@ _BLOCKLIST_URLS: list[str] = [
     "https://blocklistproject.github.io/Lists/alt-version/vaping-nl.txt",
 ]
 
-_blocked_domains: set[str] = set()
+_blocked_domains: frozenset[str] = frozenset()
 _blocklist_ready = threading.Event()
 
 
-def _fetch_single_list(url: str) -> set[str]:
+async def _fetch_single_list(client: httpx.AsyncClient, url: str) -> set[str]:
     domains: set[str] = set()
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": "Flight-Search/1.0"})
-        with urllib.request.urlopen(req, timeout=45) as resp:
-            for raw_line in resp:
-                line = raw_line.decode("utf-8", errors="ignore").strip().lower()
-                if line and not line.startswith("#") and not line.startswith("!"):
-                    domains.add(line)
+        resp = await client.get(url)
+        # httpx doesn't raise on HTTP errors by itself; without this a 404
+        # body would be parsed as domains and logged as a successful load
+        resp.raise_for_status()
+        # split the whole body once in C and bulk-insert via a single
+        # set.update; lines stay bytes and only accepted entries pay a
+        # decode (httpx has already transparently gunzipped the body)
+        domains.update(
+            line.lower().decode("ascii", "ignore")
+            for raw_line in resp.content.splitlines()
+            if (line := raw_line.strip()) and line[:1] not in (b"#", b"!")
+        )
     except Exception:
         log.warning("Failed to fetch blocklist: %s", url)
     return domains
 
 
+async def _fetch_all_blocklists() -> set[str]:
+    async with httpx.AsyncClient(
+        headers={"User-Agent": "Flight-Search/1.0"},
+        timeout=45,
+        limits=httpx.Limits(max_connections=16),
+        follow_redirects=True,
+    ) as client:
+        results = await asyncio.gather(*(_fetch_single_list(client, u) for u in _BLOCKLIST_URLS))
+    merged: set[str] = set()
+    for domains in results:
+        merged.update(domains)
+    return merged
+
+
 def _load_all_blocklists():
     global _blocked_domains
-    merged: set[str] = set()
-    with ThreadPoolExecutor(max_workers=6) as pool:
-        futures = {pool.submit(_fetch_single_list, u): u for u in _BLOCKLIST_URLS}
-        for future in futures:
-            merged.update(future.result())
-    _blocked_domains = merged
+    # all fetches run concurrently on one event loop inside the startup
+    # daemon thread — no thread per URL, ready once the slowest URL lands
+    merged = asyncio.run(_fetch_all_blocklists())
+    # the set is never mutated after this point: freeze it, and intern the
+    # entries so the many identical parent-domain strings share storage
+    _blocked_domains = frozenset(sys.intern(d) for d in merged)
     _blocklist_ready.set()
     log.info("Loaded %d blocked domains from %d blocklists", len(merged), len(_BLOCKLIST_URLS))
 
 
 threading.Thread(target=_load_all_blocklists, daemon=True, name="blocklist-loader").start()
 
+_UNSAFE_URL_LITERALS: tuple[str, ...] = (
+    "porn", "xxx", "nsfw", "nude", "naked", "hentai", "gore", "snuff",
+    "fetish", "escort", "sexy", "boob", "tit", "camgirl", "topless",
+    "shirtless", "darknet", "torrent", "warez", "masturbat", "blowjob",
+    "handjob", "orgasm", "vibrator", "dildo", "lingerie", "thong",
+)
+
+# token pairs that may appear joined directly or by "-", "_" or a space
+_UNSAFE_URL_PAIRS: tuple[tuple[str, str], ...] = (
+    ("webcam", "girl"), ("strip", "club"), ("dark", "web"),
+    ("crack", "download"), ("proxy", "unblocker"), ("unblock", "site"),
+    ("bypass", "filter"),
+)
+
 _UNSAFE_URL_TOKENS: re.Pattern = re.compile(
-    r"porn|xxx|nsfw|nude|naked|hentai|gore|snuff|fetish|escort|sexy|boob|tit|"
-    r"camgirl|webcam[-_ ]?girl|strip[-_ ]?club|topless|shirtless|"
-    r"darknet|dark[-_ ]?web|torrent|warez|crack[-_ ]?download|"
-    r"proxy[-_ ]?unblocker|unblock[-_ ]?site|bypass[-_ ]?filter|"
-    r"masturbat|blowjob|handjob|orgasm|vibrator|dildo|lingerie|thong",
+    "|".join(
+        [re.escape(lit) for lit in _UNSAFE_URL_LITERALS]
+        + ["%s[-_ ]?%s" % (re.escape(a), re.escape(b)) for a, b in _UNSAFE_URL_PAIRS]
+    ),
     re.IGNORECASE,
 )
 
-
+# with pyahocorasick available, scan URLs with a multi-literal automaton
+# instead of the alternation; the separator variants are expanded up front
+_URL_AC = None
+if ahocorasick is not None:
+    _URL_AC = ahocorasick.Automaton()
+    for _lit in _UNSAFE_URL_LITERALS:
+        _URL_AC.add_word(_lit, True)
+    for _a, _b in _UNSAFE_URL_PAIRS:
+        for _sep in ("", "-", "_", " "):
+            _URL_AC.add_word(_a + _sep + _b, True)
+    _URL_AC.make_automaton()
+
+
+@functools.lru_cache(maxsize=4096)
+def _url_token_hit(url_lower: str) -> bool:
+    """Memoized URL token scan — mirrors and duplicate URLs inside a result
+    page hit the cache instead of rerunning the scan."""
+    if _URL_AC is not None:
+        return next(_URL_AC.iter(url_lower), None) is not None
+    return _UNSAFE_URL_TOKENS.search(url_lower) is not None
+
+
+@functools.lru_cache(maxsize=16384)
 def _score_query(query: str) -> tuple[int, str, str, str, str]:
+    # pure function of module-level compiled rules, so repeat queries
+    # (refreshes, pagination, popular searches) skip the tier scan entirely
     query_lower = query.lower()
-    top_risk = 0
-    top_label = ""
-    top_message = ""
-    top_hotline = ""
-    top_cat = ""
-    for pattern, risk, label, message, hotline, cat in _BLOCK_RULES:
-        if pattern.search(query_lower) and risk > top_risk:
-            top_risk = risk
-            top_label = label
-            top_message = message
-            top_hotline = hotline
-            top_cat = cat
-    if top_risk == 0:
+    q_mask = _bigram_mask(query_lower)
+    for top_risk, term_masks, has_freeform, pattern in _RISK_TIERS:
+        # a tier of pure literal terms can only hit when at least one term's
+        # bigrams all occur in the query; int compares are far cheaper than
+        # running the tier's fused regex just to fail
+        if not has_freeform and not any(q_mask & m == m for m in term_masks):
+            continue
+        m = pattern.search(query_lower)
+        if m is not None:
+            top_cat = m.lastgroup or ""
+            break
+    else:
         return 0, "", "", "", ""
+    label, message, hotline = _CAT_INFO[top_cat]
     if top_cat not in _NEVER_REDUCE and _has_educational_context(query_lower):
         top_risk = max(0, top_risk - _EDUCATIONAL_SCORE_REDUCTION)
-    return top_risk, top_label, top_message, top_hotline, top_cat
+    return top_risk, label, message, hotline, top_cat
+
+
+# result fields worth scanning, hoisted so on_result doesn't rebuild the
+# tuple per result
+_FIELDS = ("title", "url", "content", "parsed_url", "img_src", "thumbnail")
+
+_LOG_INFO = logging.INFO
 
 
 def _extract_host(url: str) -> str:
-    if "://" not in url:
+    # one pass with partition: no substring scan for "://" before splitting,
+    # no throwaway lists from split()
+    _scheme, sep, rest = url.partition("://")
+    if not sep:
         return ""
-    return url.split("://", 1)[1].split("/", 1)[0].split(":")[0].lower()
+    return rest.partition("/")[0].partition(":")[0].lower()
 
 
 def _is_domain_blocked(host: str) -> bool:
-    if not host:
-        return False
-    parts = host.split(".")
-    for i in range(len(parts) - 1):
-        if ".".join(parts[i:]) in _blocked_domains:
+    # walk from the full host to each parent domain by slicing at the next
+    # dot — no split/join garbage, one substring per level, and the bare TLD
+    # is never probed
+    dot = host.find(".")
+    while dot >= 0:
+        if host in _blocked_domains:
             return True
+        host = host[dot + 1:]
+        dot = host.find(".")
     return False
 
 
@@ -593,6 +751,12 @@ class SXNGPlugin(Plugin):
         risk, label, message, hotline, cat = _score_query(query)
         flask.g.risk_score = risk
         flask.g.risk_label = label
+        # constant for the whole query; both the threshold and its bisected
+        # cumulative pattern are resolved here so on_result does neither per
+        # result
+        threshold = 0 if risk >= 60 else (risk if risk >= 30 else 80)
+        flask.g.risk_threshold = threshold
+        flask.g.bucket_pattern = _rules_pattern(threshold)
         if risk >= 80:
             request.blocked_message = message
             request.blocked_hotline = hotline
@@ -604,28 +768,34 @@ class SXNGPlugin(Plugin):
 
     def on_result(self, request: "SXNG_Request", search: "SearchWithPlugins", result: dict) -> bool:
         url = result.get("url", "") or ""
-        host = _extract_host(url)
+        url_lower = url.lower()
+        host = _extract_host(url_lower)
         if _is_domain_blocked(host):
-            log.info("Blocklist suppressed domain: %s", host)
+            if log.isEnabledFor(_LOG_INFO):
+                log.info("Blocklist suppressed domain: %s", host)
             return False
-        if _UNSAFE_URL_TOKENS.search(url.lower()):
-            log.info("URL token filter suppressed: %s", url[:120])
+        if _url_token_hit(url_lower):
+            if log.isEnabledFor(_LOG_INFO):
+                log.info("URL token filter suppressed: %s", url[:120])
             return False
         risk = getattr(flask.g, "risk_score", 0)
         if risk <= 0:
             return True
-        text_parts: list[str] = []
-        for key in ("title", "url", "content", "parsed_url", "img_src", "thumbnail"):
-            val = result.get(key)
-            if val:
-                text_parts.append(str(val).lower())
-        searchable = " ".join(text_parts)
-        if not searchable:
+        pattern = getattr(flask.g, "bucket_pattern", None)
+        if pattern is None:
             return True
-        threshold = 0 if risk >= 60 else (risk if risk >= 30 else 80)
-        for pattern, rule_risk, _label, _msg, _hl, _cat in _BLOCK_RULES:
-            if rule_risk >= threshold and pattern.search(searchable):
-                log.info("Content filter suppressed result (risk=%d): %s", risk, result.get("url", "?"))
+        # scan fields one by one: no per-result list/join allocation, and a
+        # hit in an early field (usually title or url) skips the rest. The
+        # rule patterns are IGNORECASE-compiled, so no lowering either.
+        field_search = pattern.search
+        for key in _FIELDS:
+            val = result.get(key)
+            if val and field_search(str(val)):
+                if log.isEnabledFor(_LOG_INFO):
+                    log.info(
+                        "Content filter suppressed result (risk=%d): %s",
+                        risk, result.get("url", "?"),
+                    )
                 return False
         return True
 
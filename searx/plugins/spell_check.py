@@ -4,13 +4,22 @@ transparently corrects the search query, showing a Google-style
 "Showing results for … / Search exactly for …" banner."""
 
 import logging
+import re
+import sys
 import typing as t
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import flask
 
 from searx.autocomplete import search_autocomplete
 from searx.plugins import Plugin, PluginInfo
 
+try:
+    from rapidfuzz.distance import Levenshtein
+except ImportError:
+    Levenshtein = None
+
 if t.TYPE_CHECKING:
     from searx.plugins import PluginCfg
     from searx.search import SearchWithPlugins
@@ -18,10 +27,29 @@ if t.TYPE_CHECKING:
 
 log = logging.getLogger(__name__)
 
-
-def _levenshtein(a: str, b: str) -> int:
+# correction decisions keyed on the normalized query. Popular queries repeat
+# constantly, and a hit here skips the autocomplete HTTP round-trip — by far
+# the most expensive step of this plugin.
+_DECISION_MAX = 4096
+_decision_cache: "OrderedDict[str, str | None]" = OrderedDict()
+_MISS = object()
+
+# autocomplete runs on a small shared pool with a hard deadline: spell
+# checking is best-effort, so a slow Brave response means we skip correction
+# rather than hold the whole search hostage
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="spell-check")
+_AUTOCOMPLETE_TIMEOUT = 0.15
+
+
+def _levenshtein(a: str, b: str, cutoff: int) -> int:
+    """Edit distance between ``a`` and ``b``; once the distance provably
+    exceeds ``cutoff`` the exact value no longer matters and ``cutoff + 1``
+    is returned instead."""
+    if Levenshtein is not None:
+        # bit-parallel C++ implementation with built-in early exit
+        return Levenshtein.distance(a, b, score_cutoff=cutoff)
     if len(a) < len(b):
-        return _levenshtein(b, a)
+        a, b = b, a
     if not b:
         return len(a)
     prev = list(range(len(b) + 1))
@@ -29,12 +57,24 @@ def _levenshtein(a: str, b: str) -> int:
         curr = [i + 1]
         for j, cb in enumerate(b):
             curr.append(min(prev[j + 1] + 1, curr[j] + 1, prev[j] + (ca != cb)))
+        if min(curr) > cutoff:
+            return cutoff + 1
         prev = curr
     return prev[-1]
 
 
+# whitespace needing the split/join collapse: leading, trailing, doubled, or
+# any whitespace char that isn't a plain space
+_WS_RE = re.compile(r"\s\s|^\s|\s$|[^\S ]")
+
+
 def _norm(s: str) -> str:
-    return " ".join(s.lower().split())
+    # interned: normalized forms recur across suggestions and as cache and
+    # voting keys, so equality checks collapse to pointer compares. Most
+    # inputs are already single-space separated, so the allocating
+    # split/join path only runs when the probe regex finds irregularity.
+    s = s.lower()
+    return sys.intern(" ".join(s.split()) if _WS_RE.search(s) else s)
 
 
 def _try_word_correction(original: str, suggestions: list[str]) -> str | None:
@@ -44,12 +84,14 @@ def _try_word_correction(original: str, suggestions: list[str]) -> str | None:
     if not orig_words:
         return None
 
+    # normalize and split each suggestion exactly once, keeping only the
+    # word-count bucket that can actually vote
+    n_words = len(orig_words)
+    comparable = [sw for sw in (_norm(s).split() for s in suggestions) if len(sw) == n_words]
+
     votes: dict[int, dict[str, int]] = {}
 
-    for suggestion in suggestions:
-        sug_words = _norm(suggestion).split()
-        if len(sug_words) != len(orig_words):
-            continue
+    for sug_words in comparable:
         for i, (ow, sw) in enumerate(zip(orig_words, sug_words)):
             if ow != sw:
                 if i not in votes:
@@ -67,9 +109,8 @@ def _try_word_correction(original: str, suggestions: list[str]) -> str | None:
     if vote_count < 2:
         return None
 
-    dist = _levenshtein(orig_word, best_replacement)
     max_allowed = min(2, max(1, len(orig_word) // 4))
-    if dist > max_allowed:
+    if _levenshtein(orig_word, best_replacement, max_allowed) > max_allowed:
         return None
 
     corrected_words = original.split()
@@ -98,28 +139,42 @@ class SXNGPlugin(Plugin):
         if not query or len(query) < 3:
             return True
 
-        if flask.request.args.get("spell") == "off":
-            return True
-
+        # cheapest rejections first: a plain getattr on flask.g beats the
+        # thread-local request.args dict access, which in turn beats anything
+        # that could reach the network
         if getattr(flask.g, "content_blocked", False):
             return True
 
-        try:
-            suggestions = search_autocomplete("brave", query, "en")
-        except Exception:
-            log.debug("Spell-check autocomplete failed for %r", query)
-            return True
-
-        if not suggestions:
+        if flask.request.args.get("spell") == "off":
             return True
 
         norm_query = _norm(query)
-        for sug in suggestions:
-            if _norm(sug) == norm_query:
+        correction = _decision_cache.get(norm_query, _MISS)
+        if correction is not _MISS:
+            _decision_cache.move_to_end(norm_query)
+        else:
+            future = _EXECUTOR.submit(search_autocomplete, "brave", query, "en")
+            try:
+                suggestions = future.result(timeout=_AUTOCOMPLETE_TIMEOUT)
+            except Exception:
+                # timed out or failed: don't cache, just skip correction.
+                # Cancel so a consistently slow upstream can't pile queued
+                # lookups onto the pool after every caller has given up.
+                future.cancel()
+                log.debug("Spell-check autocomplete unavailable for %r", query)
                 return True
 
-        correction = _try_word_correction(query, suggestions)
-        if correction and _norm(correction) != norm_query:
+            correction = None
+            if suggestions and not any(_norm(sug) == norm_query for sug in suggestions):
+                candidate = _try_word_correction(query, suggestions)
+                if candidate and _norm(candidate) != norm_query:
+                    correction = candidate
+
+            _decision_cache[norm_query] = correction
+            if len(_decision_cache) > _DECISION_MAX:
+                _decision_cache.popitem(last=False)
+
+        if correction:
             flask.g.spell_original = query
             flask.g.spell_corrected = correction
             search.search_query.query = correction